@@ -1,16 +1,92 @@
 """
 FastAPI application entry point.
 
-Start with:
+Start with (development):
     uvicorn backend.main:app --reload --port 8000
+
+Start with (production — uvloop event loop + httptools HTTP parser):
+    uvicorn backend.main:app --host 0.0.0.0 --port 8000 --workers $(nproc) \
+        --loop uvloop --http httptools \
+        --limit-concurrency 1000 --timeout-keep-alive 30
+
+Or under gunicorn, loading the models once in the master so the forked
+workers share them (what the Docker image runs):
+    GUNICORN_CMD_ARGS="--preload" gunicorn backend.main:app \
+        -k uvicorn_worker.UvicornWorker --workers 4 --bind 0.0.0.0:8000
+
+Or simply:
+    python -m backend.main
 """
+import logging
+import os
+import queue
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 
-from fastapi import FastAPI
+import anyio
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from backend.routers.analysis import error_response, router
+from backend.services.analysis_service import (
+    close_db,
+    ensure_db_ready,
+    preload,
+    start_batcher,
+    stop_batcher,
+)
+
+# Max concurrent blocking analyses offloaded from the event loop
+# (anyio's default is 40).
+THREADPOOL_SIZE = 64
+
+# ---------------------------------------------------------------------------
+# Logging — records are only queued on the calling thread; a listener
+# thread does the blocking stdout writes. It is started right away so
+# import-time logging (preload below) is written too, and again in each
+# forked worker by the lifespan, since threads do not survive a fork.
+# ---------------------------------------------------------------------------
+_log_queue = queue.SimpleQueue()
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[QueueHandler(_log_queue)],
+)
+_log_handler  = logging.StreamHandler()
+_log_listener = None
+_log_pid      = None              # process _log_listener runs in
+logger = logging.getLogger(__name__)
+
+
+def _start_log_listener():
+    """Start draining _log_queue in this process, unless it already is."""
+    global _log_listener, _log_pid
+    if _log_pid == os.getpid():
+        return
+    _log_listener = QueueListener(_log_queue, _log_handler)
+    _log_listener.start()
+    _log_pid = os.getpid()
+
+
+def _stop_log_listener():
+    """Write out everything queued so far and stop the listener thread."""
+    global _log_pid
+    if _log_pid == os.getpid():
+        _log_listener.stop()
+        _log_pid = None
+
 
-from backend.routers.analysis import router
-from backend.services.analysis_service import ensure_db_ready
+_start_log_listener()
+
+# `gunicorn --preload` imports this module once in the master before forking;
+# warm up there so the workers start with the models already in memory.
+# The queue is drained before the fork so no worker inherits (and prints
+# again) the master's records.
+if "--preload" in os.environ.get("GUNICORN_CMD_ARGS", ""):
+    preload()
+    _stop_log_listener()
 
 
 # ---------------------------------------------------------------------------
@@ -19,10 +95,15 @@ from backend.services.analysis_service import ensure_db_ready
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialise the SQLite database before the first request is served."""
+    _start_log_listener()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     ensure_db_ready()
-    print("✓ Database ready")
+    logger.info("Database ready")
+    start_batcher()
     yield
-    # Nothing special needed on shutdown
+    await stop_batcher()
+    close_db()
+    _stop_log_listener()           # flushes anything still queued
 
 
 # ---------------------------------------------------------------------------
@@ -36,23 +117,47 @@ app = FastAPI(
     ),
     version="3.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,   # orjson instead of stdlib json
 )
 
 # ---------------------------------------------------------------------------
-# CORS — allow the Streamlit frontend (default port 8501) to call this API
+# CORS — allow the Streamlit frontend (default port 8501) to call this API.
+# Explicit lists keep Starlette on its cheap set-lookup path; no "*" together
+# with credentials. Override the origins with a comma-separated CORS_ORIGINS,
+# e.g. CORS_ORIGINS=https://your-frontend.example.com
 # ---------------------------------------------------------------------------
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get(
+        "CORS_ORIGINS",
+        "http://localhost:8501,http://127.0.0.1:8501",   # Streamlit default
+    ).split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:8501",   # Streamlit default
-        "http://127.0.0.1:8501",
-        "*",                       # remove in production and restrict to your domain
-    ],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["content-type"],
 )
 
+# ---------------------------------------------------------------------------
+# GZip — analysis results with a long why_risk / gambling_warning run past
+# 512 bytes; level 4 gets most of the ratio on JSON for little CPU
+# ---------------------------------------------------------------------------
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=4)
+
+# ---------------------------------------------------------------------------
+# A ValueError escaping any route is a bad input — same 400 envelope as
+# POST /analyze instead of a generic 500
+# ---------------------------------------------------------------------------
+@app.exception_handler(ValueError)
+async def value_error_handler(request: Request, exc: ValueError):
+    return error_response(status.HTTP_400_BAD_REQUEST, "bad_url", exc)
+
+
 # ---------------------------------------------------------------------------
 # Register routers
 # ---------------------------------------------------------------------------
@@ -69,3 +174,30 @@ async def root():
         "docs": "/docs",
         "health": "/api/v1/health",
     }
+
+
+# ---------------------------------------------------------------------------
+# `python -m backend.main` — same fast loop/parser as the production command
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    # UVICORN_LOOP is the same variable the uvicorn CLI reads, so one setting
+    # works for both launchers, e.g. UVICORN_LOOP=rloop:new_event_loop
+    loop = os.environ.get("UVICORN_LOOP")
+    if not loop:
+        try:
+            import uvloop  # noqa: F401 — not available on Windows
+            loop = "uvloop"
+        except ImportError:
+            loop = "asyncio"
+
+    uvicorn.run(
+        "backend.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop=loop,
+        http="httptools",
+        limit_concurrency=1000,
+        timeout_keep_alive=30,
+    )
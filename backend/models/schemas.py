@@ -2,23 +2,48 @@
 Pydantic schemas for request/response validation.
 All fields map directly to what core_engine.analyze_url() returns.
 """
-from pydantic import BaseModel, HttpUrl, field_validator
+import re
+from functools import cached_property
+
+import msgspec
+from pydantic import BaseModel, field_validator
 from typing import Optional
 
+# http:// or https:// prefix and at least 10 characters, checked in one
+# C-level match. Only rejected URLs fall through to the slower checks that
+# pick the error message.
+_VALID_URL_RE = re.compile(r"(?=.{10})https?://", re.DOTALL)
+
+
+def canonical_url(url: str) -> str:
+    """
+    Cache/engine key for a URL: the URL as submitted, minus surrounding
+    whitespace. Nothing else is normalised because every character is
+    scored: the length thresholds, '//' in the path, the 'https://' prefix
+    and the case-sensitive trusted/gambling domain lookups would all see a
+    different URL after lowercasing or slash stripping.
+    """
+    return url.strip()
+
 
 class URLRequest(BaseModel):
     """Request body for POST /analyze"""
     url: str
 
+    @cached_property
+    def canonical_url(self) -> str:
+        """Computed once per request and reused as LRU, SQLite and engine key."""
+        return canonical_url(self.url)
+
     @field_validator("url")
     @classmethod
     def validate_url(cls, v: str) -> str:
         v = v.strip()
+        if _VALID_URL_RE.match(v):
+            return v
         if not v.startswith(("http://", "https://")):
             raise ValueError("URL must start with http:// or https://")
-        if len(v) < 10:
-            raise ValueError("URL is too short to be valid")
-        return v
+        raise ValueError("URL is too short to be valid")
 
 
 class AnalysisResult(BaseModel):
@@ -51,6 +76,32 @@ class AnalysisResult(BaseModel):
     cached: bool = False                    # True if result was served from DB cache
 
 
+class AnalysisResultMsg(msgspec.Struct, frozen=True):
+    """
+    Internal transport form of AnalysisResult — same fields, same order,
+    so it encodes to the same JSON. core_engine is trusted, so the service
+    and router pass this msgspec Struct around and encode it directly;
+    the Pydantic model above is only used for the OpenAPI schema.
+    """
+    url: str
+    domain: str
+    domain_score: int
+    url_score: int
+    keyword_score: int
+    security_score: int
+    redirect_score: int
+    total_score: int
+    risk_level: str
+    risk_level_numeric: int
+    risk_type: str
+    confidence_percent: float
+    risk_severity_index: int
+    anomaly_detected: bool
+    why_risk: str
+    gambling_warning: Optional[str]
+    cached: bool
+
+
 class HealthResponse(BaseModel):
     """Response for GET /health"""
     status: str
@@ -58,6 +109,12 @@ class HealthResponse(BaseModel):
     version: str
 
 
+class CacheFlushResponse(BaseModel):
+    """Response for POST /admin/flush"""
+    status: str
+    flushed: int                     # number of in-memory entries dropped
+
+
 class ErrorResponse(BaseModel):
     """Standardised error envelope"""
     error: str
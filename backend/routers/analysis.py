@@ -2,22 +2,45 @@
 API routers — defines all HTTP endpoints.
 
 Endpoints:
-    POST /analyze   →  run URL risk analysis via core_engine
-    GET  /health    →  liveness probe
+    POST /analyze       →  run URL risk analysis via core_engine
+    GET  /health        →  liveness probe
+    POST /admin/flush   →  clear the in-memory result cache (needs ADMIN_TOKEN)
 """
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+import hmac
+import os
+from typing import Optional
+
+import msgspec
+import orjson
+from fastapi import APIRouter, Header, Response, status
+from fastapi.responses import ORJSONResponse
 
 from backend.models.schemas import (
     URLRequest,
     AnalysisResult,
     HealthResponse,
+    CacheFlushResponse,
     ErrorResponse,
 )
-from backend.services.analysis_service import run_analysis
+from backend.services.analysis_service import analyze, clear_cache
 
 router = APIRouter()
 
+# Encodes the service's AnalysisResultMsg structs straight to JSON bytes
+_encoder = msgspec.json.Encoder()
+
+
+def error_response(status_code: int, error: str, exc: Exception) -> ORJSONResponse:
+    """Build the ErrorResponse envelope directly, without raising HTTPException."""
+    return ORJSONResponse({"error": error, "detail": str(exc)}, status_code=status_code)
+
+# /health never changes, so its body is serialised once at import time
+_HEALTH_BYTES = orjson.dumps(HealthResponse(
+    status="ok",
+    message="URL Risk Analyzer API is running",
+    version="3.0.0",
+).model_dump())
+
 
 # ---------------------------------------------------------------------------
 # POST /analyze
@@ -25,6 +48,7 @@ router = APIRouter()
 @router.post(
     "/analyze",
     response_model=AnalysisResult,
+    response_class=ORJSONResponse,
     summary="Analyse a URL for security risks",
     responses={
         400: {"model": ErrorResponse, "description": "Invalid or un-parseable URL"},
@@ -42,23 +66,25 @@ async def analyze_url_endpoint(request: URLRequest):
 
     Results are automatically cached in SQLite — submitting the same URL a
     second time returns the cached result in milliseconds.
+
+    The analysis itself is blocking (scikit-learn inference + SQLite), so it
+    runs on the worker threadpool instead of stalling the event loop.
+    Concurrent requests are coalesced into a single batched model call.
+
+    The service's result is a trusted msgspec Struct, so it is encoded
+    directly instead of being re-validated through `AnalysisResult`,
+    which is kept as `response_model` for the OpenAPI docs.
     """
     try:
-        result = run_analysis(request.url)
+        result = await analyze(request.canonical_url)
     except ValueError as exc:
         # Bad URL or core_engine returned an error dict
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(exc),
-        )
+        return error_response(status.HTTP_400_BAD_REQUEST, "bad_url", exc)
     except RuntimeError as exc:
         # Unexpected engine failure
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(exc),
-        )
+        return error_response(status.HTTP_500_INTERNAL_SERVER_ERROR, "engine_failure", exc)
 
-    return AnalysisResult(**result)
+    return Response(_encoder.encode(result), media_type="application/json")
 
 
 # ---------------------------------------------------------------------------
@@ -73,9 +99,45 @@ async def health_check():
     """
     Returns a simple status payload. Use this to verify the backend is running
     before wiring up the Streamlit frontend.
+
+    Load balancers poll this constantly, so it returns pre-built bytes;
+    `response_model` is only there for the OpenAPI docs.
+    """
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
+
+
+# ---------------------------------------------------------------------------
+# POST /admin/flush — only served when ADMIN_TOKEN is set, and only to
+# callers sending it in X-Admin-Token. It wipes every worker's shared
+# Redis cache, so it must not be open to any client of the public API.
+# ---------------------------------------------------------------------------
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    # compare_digest: the comparison time does not leak how much matched
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode(), ADMIN_TOKEN.encode())
+
+
+@router.post(
+    "/admin/flush",
+    response_model=CacheFlushResponse,
+    summary="Clear the in-memory result cache",
+    responses={
+        403: {"model": ErrorResponse, "description": "Missing or wrong X-Admin-Token"},
+    },
+)
+async def flush_cache(x_admin_token: Optional[str] = Header(None)):
+    """
+    Drops every result held in the in-process LRU. Call this after correcting
+    labels with `database.update_labels()` so the API stops serving the old
+    verdicts. The permanent SQLite cache is not touched.
+
+    Requires the `X-Admin-Token` header to match the `ADMIN_TOKEN`
+    environment variable; without `ADMIN_TOKEN` every call is refused.
     """
-    return HealthResponse(
-        status="ok",
-        message="URL Risk Analyzer API is running",
-        version="3.0.0",
-    )
+    if not _is_admin(x_admin_token):
+        return error_response(status.HTTP_403_FORBIDDEN, "forbidden",
+                              PermissionError("missing or invalid X-Admin-Token"))
+    return CacheFlushResponse(status="ok", flushed=clear_cache())
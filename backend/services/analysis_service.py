@@ -8,24 +8,81 @@ because it is not a DB column. When a cached result is returned, that field
 is simply absent from the dict. We re-generate the warning using the same
 get_gambling_warning() function from core_engine so Pydantic always receives
 a complete, valid response dict — whether the result was cached or fresh.
+
+In front of all of that sits a bounded in-process LRU keyed on the
+canonical URL, so repeat lookups never leave Python (no SQLite round-trip,
+no threadpool hop). When REDIS_URL is set, misses then check a Redis cache
+shared by every worker (see shared_cache.py) before core_engine runs.
+Flush both with POST /admin/flush (X-Admin-Token) after relabelling rows.
+
+Finished results leave this module as immutable AnalysisResultMsg structs
+rather than dicts: the LRU can hand out one shared instance per URL and
+the router encodes them straight to the response body with msgspec.
 """
-import sys
-from pathlib import Path
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+import anyio
+import msgspec
 
-# Make sure core_engine (wherever it lives) is importable.
-CORE_DIR = Path(__file__).parent.parent.parent / "core"
-sys.path.insert(0, str(CORE_DIR))
+from core_engine import analyze_url, analyze_urls, get_gambling_warning, warm_up
+from database import (                                         # called once at startup
+    initialize_database,
+    open_connections,
+    close_connections,
+    clear_result_cache,
+)
+from backend.models.schemas import AnalysisResultMsg, canonical_url
+from backend.services import shared_cache
+from backend.services.batcher import MAX_BATCH, MicroBatcher
 
-from core_engine import analyze_url, get_gambling_warning   # main fn + warning helper
-from database import initialize_database                      # called once at startup
+logger = logging.getLogger(__name__)
 
 
 def ensure_db_ready():
     """
     Called once at application startup (see main.py lifespan).
-    Initialises the SQLite schema if it does not already exist.
+    Initialises the SQLite schema if it does not already exist, opens the
+    pooled writer connection every request reuses, connects the shared
+    Redis cache if one is configured, and warms the models so the first
+    request is not slowed by unpickling.
     """
     initialize_database()
+    open_connections()
+    shared_cache.connect()
+    _warm_models()
+
+
+def preload():
+    """
+    Called from main.py at import time under `gunicorn --preload`, i.e. in
+    the master before it forks: schema plus warm models, so every worker
+    inherits the loaded code and model pages copy-on-write. The SQLite
+    connections initialize_database() borrowed are closed again and the
+    Redis client is never opened — a connection must never cross a fork;
+    each worker opens its own in the lifespan.
+    """
+    initialize_database()
+    close_connections()
+    _warm_models()
+
+
+def _warm_models():
+    try:
+        warm_up()
+    except Exception as exc:
+        # Not fatal: requests fall back to loading the models themselves
+        logger.warning("Model warm-up failed: %s", exc)
+
+
+def close_db():
+    """Called once at shutdown — closes the pooled SQLite connections and Redis client."""
+    close_connections()
+    shared_cache.close()
 
 
 def _patch_gambling_warning(result: dict) -> dict:
@@ -41,36 +98,190 @@ def _patch_gambling_warning(result: dict) -> dict:
         # Fresh result — field is already present (may be None)
         return result
 
+    if result.get("risk_type") != "Gambling/Betting":
+        # get_gambling_warning() only ever warns for gambling rows
+        result["gambling_warning"] = None
+        return result
+
+    result["gambling_warning"] = _warn(
+        result.get("total_score", 0),
+        result.get("keyword_score", 0),
+        result["risk_type"],
+    )
+    return result
+
+
+@lru_cache(maxsize=1024)
+def _warn(total_score, keyword_score, risk_type):
+    """
+    The warning is a pure function of these three stored fields, so it is
+    memoised instead of rebuilding a features dict on every cached hit.
+    """
     # Build a minimal features-like dict from what the DB did store
     fake_features = {
-        "total_score":        result.get("total_score", 0),
-        "keyword_score":      result.get("keyword_score", 0),
-        "is_gambling":        result.get("risk_type") == "Gambling/Betting",
-        "inferred_risk_type": result.get("risk_type", "Unknown"),
+        "total_score":        total_score,
+        "keyword_score":      keyword_score,
+        "is_gambling":        risk_type == "Gambling/Betting",
+        "inferred_risk_type": risk_type,
     }
-    result["gambling_warning"] = get_gambling_warning(fake_features)
+    return get_gambling_warning(fake_features)
+
+
+# Keys of an engine result that make up the response (drops e.g. analyzed_at)
+_RESULT_FIELDS = AnalysisResultMsg.__struct_fields__
+
+
+def _to_msg(result: dict) -> AnalysisResultMsg:
+    return AnalysisResultMsg(**{name: result[name] for name in _RESULT_FIELDS})
+
+
+# ---------------------------------------------------------------------------
+# In-process LRU of finished results
+# ---------------------------------------------------------------------------
+CACHE_SIZE = int(os.environ.get("ANALYZE_CACHE_SIZE", "4096"))
+
+_cache      = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(key: str) -> Optional[AnalysisResultMsg]:
+    # Entries are frozen, so every hit can share the stored instance
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+    return result
+
+
+def _cache_put(key: str, result: AnalysisResultMsg) -> AnalysisResultMsg:
+    """Store `result` in the LRU; returns the `cached=True` copy that was stored."""
+    if not result.cached:
+        result = msgspec.structs.replace(result, cached=True)
+    if CACHE_SIZE <= 0:
+        return result
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
     return result
 
 
-def run_analysis(url: str) -> dict:
+def clear_cache() -> int:
+    """
+    Drop every cached result: in this worker's LRU, in database.py's row
+    LRU, and in the shared Redis cache. Returns how many entries were
+    flushed.
     """
-    Call core_engine.analyze_url() and return its result dict.
-    Always guarantees the returned dict contains 'gambling_warning'.
+    with _cache_lock:
+        flushed = len(_cache)
+        _cache.clear()
+    return flushed + clear_result_cache() + shared_cache.clear()
+
+
+def _finalise(result: dict) -> AnalysisResultMsg:
+    # core_engine signals an invalid URL by setting result['error']
+    if "error" in result:
+        raise ValueError(result["error"])
+
+    # Guarantee gambling_warning exists (handles both fresh + cached paths)
+    return _to_msg(_patch_gambling_warning(result))
+
+
+def run_analysis(url: str) -> AnalysisResultMsg:
+    """
+    Call core_engine.analyze_url() and return the finished result.
+    Always guarantees the result carries 'gambling_warning'.
 
     Raises:
         ValueError   – if core_engine signals a bad URL via an 'error' key
         RuntimeError – for unexpected exceptions inside the analysis engine
     """
+    return _run_canonical(canonical_url(url))
+
+
+def _run_canonical(key: str) -> AnalysisResultMsg:
+    """run_analysis() for a URL that is already in canonical form."""
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    shared = shared_cache.get(key)
+    if shared is not None:
+        _cache_put(key, shared)
+        return shared
+
     try:
-        result = analyze_url(url)
+        result = analyze_url(key)
     except Exception as exc:
         raise RuntimeError(f"Analysis engine failure: {exc}") from exc
 
-    # core_engine signals an invalid URL by setting result['error']
-    if "error" in result:
-        raise ValueError(result["error"])
+    result = _finalise(result)
+    shared_cache.put_many([(key, _cache_put(key, result))])
+    return result
+
+
+def run_analysis_batch(urls: list) -> list:
+    """
+    Batch counterpart of run_analysis() used by the micro-batcher.
+    `urls` must already be canonical (see analyze()).
+    Returns one item per URL: the AnalysisResultMsg, or the ValueError /
+    RuntimeError that run_analysis() would have raised for it.
+    """
+    items  = shared_cache.get_many(urls)
+    misses = [i for i, item in enumerate(items) if item is None]
+    for url, item in zip(urls, items):
+        if item is not None:
+            _cache_put(url, item)
+    if not misses:
+        return items
+
+    try:
+        results = analyze_urls([urls[i] for i in misses])
+    except Exception as exc:
+        for i in misses:
+            items[i] = RuntimeError(f"Analysis engine failure: {exc}")
+        return items
+
+    fresh = []
+    for i, result in zip(misses, results):
+        try:
+            result = _finalise(result)
+        except ValueError as exc:
+            items[i] = exc
+            continue
+        fresh.append((urls[i], _cache_put(urls[i], result)))
+        items[i] = result
+    shared_cache.put_many(fresh)
+    return items
 
-    # Guarantee gambling_warning exists (handles both fresh + cached paths)
-    result = _patch_gambling_warning(result)
 
-    return result
\ No newline at end of file
+# ---------------------------------------------------------------------------
+# Micro-batching — started/stopped by the FastAPI lifespan (see main.py)
+# ---------------------------------------------------------------------------
+_batcher = MicroBatcher(run_analysis_batch)
+
+
+def start_batcher():
+    """Start coalescing concurrent requests. A batch size of 1 disables it."""
+    if MAX_BATCH > 1:
+        _batcher.start()
+
+
+async def stop_batcher():
+    await _batcher.stop()
+
+
+async def analyze(key: str) -> AnalysisResultMsg:
+    """
+    Async entry point for the router. `key` must already be canonical —
+    the router passes URLRequest.canonical_url so it is computed only once.
+    LRU hits are answered straight from the event loop; misses go through
+    the micro-batcher when it is running, otherwise through the threadpool.
+    Raises the same ValueError / RuntimeError as run_analysis().
+    """
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    if _batcher.running:
+        return await _batcher.submit(key)
+    return await anyio.to_thread.run_sync(_run_canonical, key)
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Shared result cache — optional Redis layer between each worker's in-process
+LRU and SQLite.
+
+The LRU in analysis_service is per process, so under gunicorn a URL first
+seen by one worker is still a miss in all the others. With REDIS_URL set,
+finished results are also stored in Redis (msgspec-encoded, with a TTL) and
+looked up there before core_engine runs, so any worker's result serves all
+of them.
+
+Everything here is best-effort: without the `redis` package or REDIS_URL
+the layer is disabled, and a Redis error is logged and treated as a miss.
+
+Configuration (environment variables):
+    REDIS_URL            e.g. redis://localhost:6379/0   (unset = disabled)
+    ANALYZE_REDIS_TTL    seconds a result is kept         (default 86400)
+"""
+import logging
+import os
+from typing import Optional
+
+import msgspec
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from backend.models.schemas import AnalysisResultMsg
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL  = os.environ.get("REDIS_URL", "")
+REDIS_TTL  = int(os.environ.get("ANALYZE_REDIS_TTL", "86400"))
+KEY_PREFIX = "url-risk:analysis:"
+
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(AnalysisResultMsg)
+_client  = None
+
+
+def connect():
+    """Create the client. Called per worker from the lifespan — never before a fork."""
+    global _client
+    if not REDIS_URL:
+        return
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+        return
+    _client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5,
+                                   socket_connect_timeout=0.5)
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_many(keys: list) -> list:
+    """One MGET for `keys`; returns an AnalysisResultMsg or None per key."""
+    if _client is None or not keys:
+        return [None] * len(keys)
+    try:
+        values = _client.mget([KEY_PREFIX + key for key in keys])
+    except redis.RedisError as exc:
+        logger.warning("Redis lookup failed: %s", exc)
+        return [None] * len(keys)
+    return [_decode(value) for value in values]
+
+
+def get(key: str) -> Optional[AnalysisResultMsg]:
+    return get_many([key])[0]
+
+
+def put_many(items: list):
+    """Store (key, AnalysisResultMsg) pairs in one pipelined round-trip."""
+    if _client is None or not items:
+        return
+    try:
+        pipe = _client.pipeline(transaction=False)
+        for key, result in items:
+            pipe.set(KEY_PREFIX + key, _encoder.encode(result), ex=REDIS_TTL)
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("Redis store failed: %s", exc)
+
+
+def clear() -> int:
+    """Delete every shared result. Returns how many keys were removed."""
+    if _client is None:
+        return 0
+    removed = 0
+    try:
+        keys = []
+        for key in _client.scan_iter(match=KEY_PREFIX + "*", count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                removed += _client.unlink(*keys)
+                keys = []
+        if keys:
+            removed += _client.unlink(*keys)
+    except redis.RedisError as exc:
+        logger.warning("Redis flush failed: %s", exc)
+    return removed
+
+
+def _decode(value) -> Optional[AnalysisResultMsg]:
+    if value is None:
+        return None
+    try:
+        return _decoder.decode(value)
+    except msgspec.DecodeError:
+        # Written by an older schema — treat as a miss; it will be overwritten
+        return None
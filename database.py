@@ -9,15 +9,25 @@ train_model.py (which uses redirect_score=type_hint_int since no live check is d
 For live-analyzed URLs, redirect_score contains the real redirect count and
 type_hint is inferred from predicted_risk_type at training time.
 """
+import atexit
+import logging
 import sqlite3
 import threading
 import os
-from datetime import datetime
+import queue
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
 DB_DIR  = Path(__file__).parent / "db"
 DB_PATH = DB_DIR / "url_risk.db"
-db_lock = threading.Lock()
+# Serialises writers only; WAL readers never wait on it (or on a writer)
+write_lock = threading.Lock()
 
 TYPE_HINT_MAP = {
     'Unknown':          0,
@@ -30,140 +40,688 @@ TYPE_HINT_MAP = {
     'Financial Fraud':  6,
 }
 
+# TYPE_HINT_MAP as a SQL expression; fills risk_type_id for rows stored
+# before that column existed
+_TYPE_HINT_SQL = "CASE COALESCE(predicted_risk_type, 'Unknown') %s ELSE 0 END" % " ".join(
+    "WHEN '%s' THEN %d" % (rtype, hint) for rtype, hint in TYPE_HINT_MAP.items() if hint)
+
+
+# Applied to every new connection. journal_mode is not here: WAL is
+# persisted in the file, so initialize_database() sets it once. With WAL,
+# synchronous=NORMAL is still corruption-safe and skips the fsync per commit;
+# busy_timeout makes a connection wait out another's write lock instead of
+# failing with "database is locked". wal_autocheckpoint is per connection
+# too: at 10000 pages (~40 MB) a bulk load is not stalled by a checkpoint
+# every 1000 pages (the default).
+SESSION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",      # ms
+    "PRAGMA wal_autocheckpoint=10000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",     # 256 MB
+    "PRAGMA cache_size=-65536",       # 64 MB
+)
+
 
-def get_connection():
+def get_connection(readonly=False):
+    """Open a new connection with SESSION_PRAGMAS applied. Prefer borrow()."""
     DB_DIR.mkdir(exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    # Readers open the file read-only (mode=ro), so SQLite never takes a
+    # write lock or runs hot-journal recovery on their behalf; query_only
+    # also refuses writes on the SQL level. No cache=shared: with WAL every
+    # connection must keep its own page cache.
+    # cached_statements: room for every statement below plus each
+    # _SELECT_IN_SQL size
+    if readonly:
+        conn = sqlite3.connect(DB_PATH.resolve().as_uri() + "?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=256)
+    else:
+        conn = sqlite3.connect(str(DB_PATH), check_same_thread=False,
+                               cached_statements=256)
+    for pragma in SESSION_PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+# Connection pool: one writer shared by every thread (serialised by
+# write_lock) and one query_only reader per thread, all kept open for the life
+# of the process instead of paying an open/close per call. Under WAL a
+# reader sees everything the writer has committed.
+_writer       = None
+_readers      = threading.local()
+_reader_conns = []                # (thread, conn), so close_connections() can reach them
+_pool_lock    = threading.Lock()
+
+# The writer refreshes planner statistics after this many write blocks
+OPTIMIZE_EVERY = 1000
+_writes        = 0
+
+
+def _reader():
+    conn = getattr(_readers, "conn", None)
+    if conn is None:
+        conn = get_connection(readonly=True)
+        thread = threading.current_thread()
+        with _pool_lock:
+            # Threads come and go (e.g. the API's threadpool); close the
+            # readers of the ones that have exited
+            for dead, dead_conn in [e for e in _reader_conns if not e[0].is_alive()]:
+                dead_conn.close()
+                _reader_conns.remove((dead, dead_conn))
+            _reader_conns.append((thread, conn))
+        _readers.conn = conn
     return conn
 
 
+@contextmanager
+def borrow(readonly):
+    """
+    Lend a pooled connection. `readonly=True` gives this thread's reader
+    without taking any lock; `readonly=False` holds write_lock and gives the
+    writer. A writer block that raises is rolled back so the failed
+    statements cannot leak into the next commit.
+    """
+    global _writer, _writes
+    if readonly:
+        yield _reader()
+        return
+    with write_lock:
+        if _writer is None:
+            _writer = get_connection()
+        try:
+            yield _writer
+        except BaseException:
+            if _writer.in_transaction:
+                _writer.rollback()
+            raise
+        _writes += 1
+        if _writes % OPTIMIZE_EVERY == 0 and not _writer.in_transaction:
+            _writer.execute("PRAGMA optimize")
+
+
+def open_connections():
+    """
+    Open the writer up front so the first request does not pay for it.
+    Idempotent; call once at startup after initialize_database() has
+    switched the file to WAL.
+    """
+    with borrow(readonly=False):
+        pass
+
+
+@atexit.register
+def close_connections():
+    """
+    Close every pooled connection. The API calls this at shutdown, and it
+    must run before a fork (gunicorn --preload) so no handle crosses it;
+    the next borrow() opens fresh ones. Queued writes are committed first.
+    """
+    global _writer, _readers
+    flush()
+    with write_lock, _pool_lock:
+        if _writer is not None:
+            # Refresh planner statistics from what this process queried
+            _writer.execute("PRAGMA optimize")
+            _writer.close()
+            _writer = None
+        for _, conn in _reader_conns:
+            conn.close()
+        _reader_conns.clear()
+        # Forget every thread's (now closed) reader
+        _readers = threading.local()
+
+
+# url is the primary key and the table is stored in its B-tree (WITHOUT
+# ROWID): a lookup by url is one B-tree descent instead of index -> rowid
+# -> table, and an insert maintains one tree fewer. STRICT stores and
+# checks the declared types; it needs SQLite 3.37+.
+_COLUMNS = (
+    ("url",                  "TEXT PRIMARY KEY"),
+    ("domain",               "TEXT NOT NULL"),
+    ("domain_score",         "INTEGER"),
+    ("url_score",            "INTEGER"),
+    ("keyword_score",        "INTEGER"),
+    ("security_score",       "INTEGER"),
+    ("redirect_score",       "INTEGER"),
+    ("total_score",          "INTEGER"),
+    ("predicted_risk_level", "INTEGER"),
+    ("predicted_risk_type",  "TEXT"),
+    ("risk_type_id",         "INTEGER"),
+    ("confidence_percent",   "REAL"),
+    ("anomaly_detected",     "INTEGER"),
+    ("risk_severity_index",  "INTEGER"),
+    ("why_risk",             "TEXT"),
+    ("actual_risk_level",    "INTEGER"),
+    ("actual_risk_type",     "TEXT"),
+    ("analyzed_at",          "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ("updated_at",           "TEXT DEFAULT CURRENT_TIMESTAMP"),
+)
+_TABLE_OPTIONS = ("WITHOUT ROWID, STRICT" if sqlite3.sqlite_version_info >= (3, 37)
+                  else "WITHOUT ROWID")
+
+
+def _create_table_sql(name, options):
+    return "CREATE TABLE IF NOT EXISTS %s (\n    %s\n) %s" % (
+        name, ",\n    ".join("%s %s" % column for column in _COLUMNS), options)
+
+
+def _migrate_rowid_table(cursor):
+    """
+    Rebuild a url_analysis from before the WITHOUT ROWID layout (surrogate
+    `id` key) in place. Runs inside initialize_database()'s transaction,
+    which recreates the indexes and triggers DROP TABLE takes with it.
+    """
+    names = ", ".join(name for name, _ in _COLUMNS)
+    copy  = "INSERT INTO url_analysis_new (%s) SELECT %s FROM url_analysis" % (names, names)
+    cursor.execute(_create_table_sql("url_analysis_new", _TABLE_OPTIONS))
+    try:
+        cursor.execute(copy)
+    except sqlite3.IntegrityError as e:
+        # A stored value STRICT rejects: keep the rows, drop the type checks
+        logger.warning("url_analysis kept without STRICT: %s", e)
+        cursor.execute("DROP TABLE url_analysis_new")
+        cursor.execute(_create_table_sql("url_analysis_new", "WITHOUT ROWID"))
+        cursor.execute(copy)
+    cursor.execute("DROP TABLE url_analysis")
+    cursor.execute("ALTER TABLE url_analysis_new RENAME TO url_analysis")
+    logger.info("url_analysis migrated to WITHOUT ROWID")
+
+
 def initialize_database():
-    with db_lock:
-        conn = get_connection()
+    with borrow(readonly=False) as conn:
+        # Persistent: readers run alongside the writer from now on
+        conn.execute("PRAGMA journal_mode=WAL")
+        # One transaction, so meta's row_count is seeded and its triggers
+        # created before any other connection can insert
+        conn.execute("BEGIN IMMEDIATE")
         cursor = conn.cursor()
+        cursor.execute(_create_table_sql("url_analysis", _TABLE_OPTIONS))
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(url_analysis)")}
+        # risk_type_id: TYPE_HINT_MAP[predicted_risk_type], the type_hint
+        # feature, so training reads a small int instead of mapping strings
+        if 'risk_type_id' not in columns:
+            cursor.execute("ALTER TABLE url_analysis ADD COLUMN risk_type_id INTEGER")
+            cursor.execute("UPDATE url_analysis SET risk_type_id = %s" % _TYPE_HINT_SQL)
+        if 'id' in columns:
+            _migrate_rowid_table(cursor)
+        # url is the primary key now; older databases also had idx_url on it
+        cursor.execute("DROP INDEX IF EXISTS idx_url")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_domain ON url_analysis(domain)")
+        # Covers get_training_data(): its ORDER BY analyzed_at DESC scan reads
+        # the index alone, never the table. Supersedes idx_analyzed_at, which
+        # is a prefix of it, and idx_training_cov, which lacked risk_type_id.
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS url_analysis (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT NOT NULL UNIQUE,
-            domain TEXT NOT NULL,
-            domain_score INTEGER,
-            url_score INTEGER,
-            keyword_score INTEGER,
-            security_score INTEGER,
-            redirect_score INTEGER,
-            total_score INTEGER,
-            predicted_risk_level INTEGER,
-            predicted_risk_type TEXT,
-            confidence_percent REAL,
-            anomaly_detected INTEGER,
-            risk_severity_index INTEGER,
-            why_risk TEXT,
-            actual_risk_level INTEGER,
-            actual_risk_type TEXT,
-            analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE INDEX IF NOT EXISTS idx_training ON url_analysis(
+            analyzed_at DESC, domain_score, url_score, keyword_score,
+            security_score, redirect_score, risk_type_id,
+            predicted_risk_level, predicted_risk_type
         )
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_url ON url_analysis(url)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_domain ON url_analysis(domain)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_analyzed_at ON url_analysis(analyzed_at)")
+        cursor.execute("DROP INDEX IF EXISTS idx_analyzed_at")
+        cursor.execute("DROP INDEX IF EXISTS idx_training_cov")
+        # Row count kept up to date by triggers, so get_record_count() is a
+        # primary-key lookup instead of a COUNT(*) over the whole table.
+        # Triggers fire for every writer, including INSERT OR IGNORE in
+        # train_model.py and manual deletes; an upsert that updates does not
+        # fire the INSERT trigger.
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+        """)
+        cursor.execute("""
+        INSERT OR IGNORE INTO meta (key, value)
+        SELECT 'row_count', COUNT(*) FROM url_analysis
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_row_count_insert
+        AFTER INSERT ON url_analysis BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'row_count';
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_row_count_delete
+        AFTER DELETE ON url_analysis BEGIN
+            UPDATE meta SET value = value - 1 WHERE key = 'row_count';
+        END
+        """)
         conn.commit()
-        conn.close()
+        # Cheap when nothing changed; re-analyses tables whose stats went stale
+        conn.execute("PRAGMA optimize")
         print(f"✓ Database initialized: {DB_PATH}")
 
 
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER (999 on older builds)
+_MAX_IN_PARAMS = 512
+
+# All SQL lives in constants so every call passes sqlite3 the identical
+# string and reuses the connection's prepared statement instead of
+# re-parsing it
+# Rows come back as plain tuples (no sqlite3.Row name lookups), so every
+# query names its columns and readers unpack them by position
+_RESULT_COLUMNS = """
+    url, domain, domain_score, url_score, keyword_score, security_score,
+    redirect_score, total_score, predicted_risk_level, predicted_risk_type,
+    confidence_percent, anomaly_detected, risk_severity_index, why_risk,
+    actual_risk_level, actual_risk_type, analyzed_at
+"""
+_SELECT_CACHED_SQL = 'SELECT %s FROM url_analysis WHERE url = ?' % _RESULT_COLUMNS
+
+# Maintained by the row_count triggers (see initialize_database())
+_COUNT_SQL = "SELECT value FROM meta WHERE key = 'row_count'"
+
+
+# get_cached_results() rounds each IN (...) list up to a power of two and
+# pads it, so batches of every size share these few prepared statements
+# instead of each size pushing another one through the statement cache
+_SELECT_IN_SQL = {
+    size: 'SELECT %s FROM url_analysis WHERE url IN (%s)' % (_RESULT_COLUMNS,
+                                                             ','.join('?' * size))
+    for size in (1 << bits for bits in range(_MAX_IN_PARAMS.bit_length()))
+}
+
+
+def _select_in(chunk):
+    """The _SELECT_IN_SQL statement for `chunk`, and its padded parameters."""
+    size = 1 << (len(chunk) - 1).bit_length()
+    # Repeating a URL inside IN (...) does not change the result
+    return _SELECT_IN_SQL[size], chunk + [chunk[0]] * (size - len(chunk))
+
+
+_RISK_NAMES = {0: 'Low', 1: 'Medium', 2: 'High', 3: 'Critical'}
+
+
+def _row_to_result(row):
+    """Build the result dict from a row of _RESULT_COLUMNS."""
+    (url, domain, domain_score, url_score, keyword_score, security_score,
+     redirect_score, total_score, predicted_level, predicted_type,
+     confidence, anomaly, severity, why_risk,
+     actual_level, actual_type, analyzed_at) = row
+    risk_level = actual_level if actual_level is not None else predicted_level
+    risk_type  = actual_type or predicted_type
+    return {
+        'url':                url,
+        'domain':             domain,
+        'domain_score':       domain_score,
+        'url_score':          url_score,
+        'keyword_score':      keyword_score,
+        'security_score':     security_score,
+        'redirect_score':     redirect_score,
+        'total_score':        total_score,
+        'risk_level':         _RISK_NAMES.get(risk_level, 'Low'),
+        'risk_level_numeric': risk_level,
+        'confidence_percent': confidence,
+        'anomaly_detected':   bool(anomaly),
+        'risk_severity_index': severity,
+        'why_risk':           why_risk or 'Multiple risk factors',
+        'risk_type':          risk_type or 'Unknown',
+        'cached':             True,
+        'analyzed_at':        analyzed_at,
+    }
+
+
+# ---------------------------------------------------------------------------
+# In-process LRU of cached rows, in front of the SELECTs below. Writes
+# through this module evict the URLs they touch; rows written by another
+# process are only picked up after clear_result_cache() or eviction.
+# ---------------------------------------------------------------------------
+RESULT_CACHE_SIZE = 4096
+
+_result_cache      = OrderedDict()
+_result_cache_lock = threading.Lock()
+# Bumped by every eviction. A lookup only stores what it read if no write
+# happened meanwhile, so a row read just before an update cannot be cached
+# after the update evicted it.
+_result_gen = 0
+
+
+def _recall(url):
+    with _result_cache_lock:
+        result = _result_cache.get(url)
+        if result is not None:
+            _result_cache.move_to_end(url)
+    # Callers patch the dicts they get (e.g. gambling_warning)
+    return dict(result) if result is not None else None
+
+
+def _remember(results, gen):
+    with _result_cache_lock:
+        if gen != _result_gen:
+            return
+        for url, result in results.items():
+            _result_cache[url] = dict(result)
+            _result_cache.move_to_end(url)
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+
+def _forget(urls):
+    global _result_gen
+    with _result_cache_lock:
+        _result_gen += 1
+        for url in urls:
+            _result_cache.pop(url, None)
+
+
+def clear_result_cache():
+    """Drop every remembered row. Returns how many were dropped."""
+    global _result_gen
+    with _result_cache_lock:
+        _result_gen += 1
+        flushed = len(_result_cache)
+        _result_cache.clear()
+    return flushed
+
+
 def get_cached_result(url):
-    with db_lock:
-        try:
-            conn = get_connection()
+    result = _queued_result(url) or _recall(url)
+    if result is not None:
+        return result
+    gen = _result_gen
+    try:
+        with borrow(readonly=True) as conn:
+            row = conn.execute(_SELECT_CACHED_SQL, (url,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error("Cache read error: %s", e)
+        return None
+    if not row:
+        return None
+    result = _row_to_result(row)
+    _remember({url: result}, gen)
+    return result
+
+
+def get_cached_results(urls):
+    """
+    Batch version of get_cached_result(): one SELECT ... IN (...) per
+    _MAX_IN_PARAMS URLs not already queued or in the LRU, instead of one
+    query each.
+    Returns {url: result} for the URLs that are cached.
+    """
+    hits, misses = {}, []
+    for url in dict.fromkeys(urls):
+        result = _queued_result(url) or _recall(url)
+        if result is not None:
+            hits[url] = result
+        else:
+            misses.append(url)
+    if not misses:
+        return hits
+    gen = _result_gen
+    fetched = {}
+    try:
+        with borrow(readonly=True) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM url_analysis WHERE url = ?', (url,))
-            row = cursor.fetchone()
-            conn.close()
-            if not row:
-                return None
-            risk_level = (row['actual_risk_level']
-                          if row['actual_risk_level'] is not None
-                          else row['predicted_risk_level'])
-            risk_type  = (row['actual_risk_type']
-                          if row['actual_risk_type']
-                          else row['predicted_risk_type'])
-            risk_map = {0: 'Low', 1: 'Medium', 2: 'High', 3: 'Critical'}
-            return {
-                'url':                row['url'],
-                'domain':             row['domain'],
-                'domain_score':       row['domain_score'],
-                'url_score':          row['url_score'],
-                'keyword_score':      row['keyword_score'],
-                'security_score':     row['security_score'],
-                'redirect_score':     row['redirect_score'],
-                'total_score':        row['total_score'],
-                'risk_level':         risk_map.get(risk_level, 'Low'),
-                'risk_level_numeric': risk_level,
-                'confidence_percent': row['confidence_percent'],
-                'anomaly_detected':   bool(row['anomaly_detected']),
-                'risk_severity_index': row['risk_severity_index'],
-                'why_risk':           row['why_risk'] or 'Multiple risk factors',
-                'risk_type':          risk_type or 'Unknown',
-                'cached':             True,
-                'analyzed_at':        row['analyzed_at'],
-            }
-        except Exception as e:
-            print(f"Cache read error: {e}")
-            return None
+            for start in range(0, len(misses), _MAX_IN_PARAMS):
+                chunk = misses[start:start + _MAX_IN_PARAMS]
+                cursor.execute(*_select_in(chunk))
+                for row in cursor.fetchall():
+                    fetched[row[0]] = _row_to_result(row)
+    except sqlite3.Error as e:
+        logger.error("Cache read error: %s", e)
+        return hits
+    _remember(fetched, gen)
+    hits.update(fetched)
+    return hits
 
 
-def store_analysis(url, domain, features, risk_label, risk_type,
+# One statement per row: the url UNIQUE index is probed once and the row is
+# inserted or updated in place
+_UPSERT_SQL = """
+    INSERT INTO url_analysis (
+        url, domain, domain_score, url_score, keyword_score,
+        security_score, redirect_score, total_score,
+        predicted_risk_level, predicted_risk_type, risk_type_id,
+        confidence_percent, anomaly_detected, risk_severity_index, why_risk
+    ) VALUES (
+        :url, :domain, :domain_score, :url_score, :keyword_score,
+        :security_score, :redirect_score, :total_score,
+        :risk_label, :risk_type, :risk_type_id, :confidence,
+        :is_anomaly, :severity, :why_risk
+    )
+    ON CONFLICT(url) DO UPDATE SET
+        domain=excluded.domain, domain_score=excluded.domain_score,
+        url_score=excluded.url_score, keyword_score=excluded.keyword_score,
+        security_score=excluded.security_score,
+        redirect_score=excluded.redirect_score,
+        total_score=excluded.total_score,
+        predicted_risk_level=excluded.predicted_risk_level,
+        predicted_risk_type=excluded.predicted_risk_type,
+        risk_type_id=excluded.risk_type_id,
+        confidence_percent=excluded.confidence_percent,
+        anomaly_detected=excluded.anomaly_detected,
+        risk_severity_index=excluded.risk_severity_index,
+        why_risk=excluded.why_risk, updated_at=CURRENT_TIMESTAMP
+"""
+
+
+def _upsert_params(url, domain, features, risk_label, risk_type,
                    confidence, is_anomaly, severity, why_risk):
-    with db_lock:
+    return {
+        'url':            url,
+        'domain':         domain,
+        'domain_score':   features['domain_score'],
+        'url_score':      features['url_score'],
+        'keyword_score':  features['keyword_score'],
+        'security_score': features['security_score'],
+        # Store type_hint in redirect_score for training-inserted rows
+        # For live rows, redirect_score is the real redirect count.
+        'redirect_score': features.get('redirect_score', 0),
+        'total_score':    features['total_score'],
+        'risk_label':     risk_label,
+        'risk_type':      risk_type,
+        'risk_type_id':   TYPE_HINT_MAP.get(risk_type or 'Unknown', 0),
+        'confidence':     confidence,
+        'is_anomaly':     int(is_anomaly),
+        'severity':       severity,
+        'why_risk':       why_risk,
+    }
+
+
+def _insert_counted(conn, sql, params):
+    """
+    executemany() `sql` in one BEGIN IMMEDIATE transaction, left open for
+    the caller to commit. Returns how many rows it added, read off the
+    trigger-maintained row_count: an upsert that updates, or an INSERT OR
+    IGNORE that skips, leaves it alone. IMMEDIATE takes the write lock
+    before the first read, so no other process's insert lands in between.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    before = conn.execute(_COUNT_SQL).fetchone()[0]
+    conn.executemany(sql, params)
+    return conn.execute(_COUNT_SQL).fetchone()[0] - before
+
+
+# ---------------------------------------------------------------------------
+# Background writer. store_analysis() / store_analyses() only queue their
+# rows; one thread commits them WRITE_BATCH at a time, so a request never
+# waits for write_lock or the commit and the commit cost is shared by the
+# batch. Queued rows are served by the cache lookups above until they are
+# committed, and flush() waits for them.
+# ---------------------------------------------------------------------------
+WRITE_BATCH = 64
+
+_write_q            = queue.Queue()
+_writer_thread      = None
+_writer_thread_lock = threading.Lock()
+# url -> (upsert params, analyzed_at) of every queued, uncommitted row
+_pending      = {}
+_pending_lock = threading.Lock()
+# Called from the writer thread with how many new rows each batch added;
+# it must return quickly (core_engine hands the work to its retrain thread)
+_write_listener = None
+
+
+def set_write_listener(listener):
+    """Call `listener(inserted)` after every committed batch of queued rows."""
+    global _write_listener
+    _write_listener = listener
+
+
+def _queued_result(url):
+    """The result dict of a queued row, as get_cached_result() would build it."""
+    with _pending_lock:
+        entry = _pending.get(url)
+    if entry is None:
+        return None
+    p, analyzed_at = entry
+    # Only URLs missing from the cache get analysed, so the queued row is
+    # (almost always) an insert: no actual_* labels to carry over
+    return _row_to_result((
+        p['url'], p['domain'], p['domain_score'], p['url_score'],
+        p['keyword_score'], p['security_score'], p['redirect_score'],
+        p['total_score'], p['risk_label'], p['risk_type'], p['confidence'],
+        p['is_anomaly'], p['severity'], p['why_risk'], None, None, analyzed_at))
+
+
+def _enqueue(params):
+    global _writer_thread
+    analyzed_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    with _pending_lock:
+        for p in params:
+            _pending[p['url']] = (p, analyzed_at)
+    thread = _writer_thread
+    if thread is None or not thread.is_alive():
+        # Started on first use, and again in a forked child: threads do not
+        # survive a fork (gunicorn --preload)
+        with _writer_thread_lock:
+            if _writer_thread is None or not _writer_thread.is_alive():
+                _writer_thread = threading.Thread(
+                    target=_write_loop, name='db-writer', daemon=True)
+                _writer_thread.start()
+    for p in params:
+        _write_q.put(p)
+
+
+def _write_loop():
+    while True:
+        batch = [_write_q.get()]
+        while len(batch) < WRITE_BATCH:
+            try:
+                batch.append(_write_q.get_nowait())
+            except queue.Empty:
+                break
+        # flush() markers are set once everything queued before them is in
+        markers = [item for item in batch if isinstance(item, threading.Event)]
+        params  = [item for item in batch if not isinstance(item, threading.Event)]
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT id FROM url_analysis WHERE url = ?', (url,))
-            existing = cursor.fetchone()
-
-            # Store type_hint in redirect_score for training-inserted rows
-            # For live rows, redirect_score is the real redirect count.
-            redirect_val = features.get('redirect_score', 0)
-
-            if existing:
-                cursor.execute("""
-                    UPDATE url_analysis SET
-                        domain=?, domain_score=?, url_score=?, keyword_score=?,
-                        security_score=?, redirect_score=?, total_score=?,
-                        predicted_risk_level=?, predicted_risk_type=?,
-                        confidence_percent=?, anomaly_detected=?,
-                        risk_severity_index=?, why_risk=?, updated_at=?
-                    WHERE url=?
-                """, (
-                    domain, features['domain_score'], features['url_score'],
-                    features['keyword_score'], features['security_score'],
-                    redirect_val, features['total_score'],
-                    risk_label, risk_type, confidence, int(is_anomaly),
-                    severity, why_risk, datetime.now(), url
-                ))
-            else:
-                cursor.execute("""
-                    INSERT INTO url_analysis (
-                        url, domain, domain_score, url_score, keyword_score,
-                        security_score, redirect_score, total_score,
-                        predicted_risk_level, predicted_risk_type, confidence_percent,
-                        anomaly_detected, risk_severity_index, why_risk
-                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """, (
-                    url, domain, features['domain_score'], features['url_score'],
-                    features['keyword_score'], features['security_score'],
-                    redirect_val, features['total_score'],
-                    risk_label, risk_type, confidence, int(is_anomaly),
-                    severity, why_risk
-                ))
+            if params:
+                _commit_queued(params)
+        finally:
+            # Even if the thread dies here (it is restarted on the next
+            # write), nobody is left waiting in flush()
+            for marker in markers:
+                marker.set()
+
+
+def _commit_queued(params):
+    inserted = None
+    try:
+        with borrow(readonly=False) as conn:
+            inserted = _insert_counted(conn, _UPSERT_SQL, params)
             conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Storage error: {e}")
-            return False
+    except sqlite3.Error as e:
+        logger.error("Storage error: %s", e)
+    finally:
+        _forget([p['url'] for p in params])
+        with _pending_lock:
+            for p in params:
+                # A newer row queued for the same URL stays pending
+                if _pending.get(p['url'], (None,))[0] is p:
+                    del _pending[p['url']]
+    if inserted is not None and _write_listener is not None:
+        try:
+            _write_listener(inserted)
+        except Exception:
+            # The listener (retraining) must not take the writer thread down
+            logger.exception("Write listener failed")
+
+
+@atexit.register
+def flush():
+    """Block until every row queued so far is committed. Runs at exit."""
+    thread = _writer_thread
+    if (thread is None or not thread.is_alive()
+            or thread is threading.current_thread()):
+        return
+    done = threading.Event()
+    _write_q.put(done)
+    done.wait()
+
+
+def store_analysis(url, domain, features, risk_label, risk_type,
+                   confidence, is_anomaly, severity, why_risk):
+    """Queue one analysis for the background writer. Returns True."""
+    _enqueue([_upsert_params(url, domain, features, risk_label, risk_type,
+                             confidence, is_anomaly, severity, why_risk)])
+    return True
+
+
+def store_analyses(rows):
+    """
+    Batch version of store_analysis(): `rows` are tuples of store_analysis()
+    arguments. Returns how many were queued; the writer commits them
+    together and reports the rows they added to the write listener.
+    """
+    _enqueue([_upsert_params(*row) for row in rows])
+    return len(rows)
+
+
+# Column order of a store_training_rows() tuple, plus risk_type_id, which
+# store_training_rows() appends
+_TRAINING_INSERT_SQL = """
+    INSERT OR IGNORE INTO url_analysis (
+        url, domain, domain_score, url_score, keyword_score,
+        security_score, redirect_score, total_score,
+        predicted_risk_level, predicted_risk_type,
+        confidence_percent, anomaly_detected,
+        risk_severity_index, why_risk, risk_type_id
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+
+def store_training_rows(rows):
+    """
+    Bulk insert for train_model.py: `rows` are tuples in _TRAINING_INSERT_SQL
+    column order, less the trailing risk_type_id (derived here), written
+    with one executemany() in one transaction. URLs
+    already in the table are skipped, never overwritten.
+    Returns how many rows were inserted (0 if the batch failed).
+    """
+    try:
+        with borrow(readonly=False) as conn:
+            inserted = _insert_counted(
+                conn, _TRAINING_INSERT_SQL,
+                (row + (TYPE_HINT_MAP.get(row[9] or 'Unknown', 0),) for row in rows))
+            conn.commit()
+            # Fold the bulk load into the database now and shrink the WAL
+            # back to zero instead of leaving it for later writers
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return inserted
+    except sqlite3.Error as e:
+        logger.error("Storage error: %s", e)
+        return 0
+
+
+# Rows per fetchmany() while streaming the training set
+_FETCH_ROWS = 8192
+
+# Exact, unlike meta's row_count (which an INSERT OR REPLACE from outside
+# this module can skew); url_analysis has no rowid, so this scans the
+# smallest index
+_TRAINING_COUNT_SQL = "SELECT COUNT(*) FROM url_analysis"
+
+_SELECT_TRAINING_SQL = """
+    SELECT domain_score, url_score, keyword_score,
+           security_score, redirect_score, risk_type_id,
+           predicted_risk_level,
+           COALESCE(predicted_risk_type, 'Unknown')
+    FROM url_analysis
+    ORDER BY analyzed_at DESC
+"""
 
 
 def get_training_data():
@@ -173,99 +731,93 @@ def get_training_data():
 
     type_hint is derived from predicted_risk_type using TYPE_HINT_MAP.
     This is the 6th feature that lets the type classifier distinguish
-    Phishing / Malware / Scam / Piracy / Financial Fraud.
+    Phishing / Malware / Scam / Piracy / Financial Fraud. It is stored
+    with each row as risk_type_id, so it is read straight from the column.
+
+    Returned as numpy arrays: X is (n, 6) int32, y_risk int64, y_type str.
+    Rows are streamed _FETCH_ROWS at a time into arrays sized by a
+    COUNT(*), so the full list of fetched rows never exists. Both queries
+    run in one read transaction, so they see the same snapshot and the
+    count matches the rows read even while the writer commits.
     """
-    with db_lock:
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT domain_score, url_score, keyword_score,
-                       security_score, redirect_score,
-                       predicted_risk_level, predicted_risk_type
-                FROM url_analysis
-                ORDER BY analyzed_at DESC
-            """)
-            rows = cursor.fetchall()
-            conn.close()
-            if not rows:
-                return None, None, None
-
-            X      = []
-            y_risk = []
-            y_type = []
-
-            for r in rows:
-                rtype     = r['predicted_risk_type'] or 'Unknown'
-                type_hint = TYPE_HINT_MAP.get(rtype, 0)
-
-                # 6-feature vector
-                X.append([
-                    r['domain_score'],
-                    r['url_score'],
-                    r['keyword_score'],
-                    r['security_score'],
-                    r['redirect_score'],
-                    type_hint,           # ← 6th feature
-                ])
-                y_risk.append(r['predicted_risk_level'])
-                y_type.append(rtype)
-
-            return X, y_risk, y_type
-        except Exception as e:
-            print(f"Training data fetch error: {e}")
+    try:
+        with borrow(readonly=True) as conn:
+            conn.execute("BEGIN DEFERRED")
+            try:
+                n = conn.execute(_TRAINING_COUNT_SQL).fetchone()[0]
+                cursor = conn.cursor()
+                cursor.arraysize = _FETCH_ROWS
+                cursor.execute(_SELECT_TRAINING_SQL)
+
+                X      = np.empty((n, 6), dtype=np.int32)
+                y_risk = np.empty(n, dtype=np.int64)
+                y_type = []
+                i = 0
+                for batch in iter(cursor.fetchmany, []):
+                    k = len(batch)
+                    columns = list(zip(*batch))
+                    for j in range(6):
+                        X[i:i + k, j] = columns[j]
+                    y_risk[i:i + k] = columns[6]
+                    y_type.extend(columns[7])
+                    i += k
+            finally:
+                conn.commit()
+        if not i:
             return None, None, None
+        return X[:i], y_risk[:i], np.array(y_type)
+    except sqlite3.Error as e:
+        logger.error("Training data fetch error: %s", e)
+        return None, None, None
 
 
 def get_record_count():
-    with db_lock:
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM url_analysis")
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count
-        except:
-            return 0
+    try:
+        with borrow(readonly=True) as conn:
+            return conn.execute(_COUNT_SQL).fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error("Record count error: %s", e)
+        return 0
+
+
+# Both distributions from one scan: count each (level, type) pair and let
+# Python fold the handful of resulting rows into the two dicts
+_CLASS_DIST_SQL = """
+    SELECT predicted_risk_level, predicted_risk_type, COUNT(*)
+    FROM url_analysis GROUP BY predicted_risk_level, predicted_risk_type
+"""
 
 
 def get_class_distribution():
-    with db_lock:
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT predicted_risk_level, COUNT(*) as count
-                FROM url_analysis GROUP BY predicted_risk_level
-            """)
-            risk_dist = {row['predicted_risk_level']: row['count']
-                         for row in cursor.fetchall()}
-            cursor.execute("""
-                SELECT predicted_risk_type, COUNT(*) as count
-                FROM url_analysis GROUP BY predicted_risk_type
-            """)
-            type_dist = {row['predicted_risk_type']: row['count']
-                         for row in cursor.fetchall()}
-            conn.close()
-            return risk_dist, type_dist
-        except:
-            return {}, {}
+    try:
+        with borrow(readonly=True) as conn:
+            pairs = conn.execute(_CLASS_DIST_SQL).fetchall()
+    except sqlite3.Error as e:
+        logger.error("Class distribution error: %s", e)
+        return {}, {}
+    risk_dist, type_dist = {}, {}
+    for risk_level, risk_type, count in pairs:
+        risk_dist[risk_level] = risk_dist.get(risk_level, 0) + count
+        type_dist[risk_type]  = type_dist.get(risk_type, 0) + count
+    return risk_dist, type_dist
+
+
+_UPDATE_LABELS_SQL = """
+    UPDATE url_analysis
+    SET actual_risk_level=?, actual_risk_type=?, updated_at=CURRENT_TIMESTAMP
+    WHERE url=?
+"""
 
 
 def update_labels(url, risk_level, risk_type):
-    with db_lock:
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE url_analysis
-                SET actual_risk_level=?, actual_risk_type=?, updated_at=?
-                WHERE url=?
-            """, (risk_level, risk_type, datetime.now(), url))
+    # The row may still be queued; it must exist before it can be relabelled
+    flush()
+    try:
+        with borrow(readonly=False) as conn:
+            conn.execute(_UPDATE_LABELS_SQL, (risk_level, risk_type, url))
             conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Label update error: {e}")
-            return False
\ No newline at end of file
+    except sqlite3.Error as e:
+        logger.error("Label update error: %s", e)
+        return False
+    _forget([url])
+    return True
\ No newline at end of file
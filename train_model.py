@@ -30,14 +30,17 @@ HOW TO RUN:
              Expected: Risk Level 100%,  Type >80%
 """
 
-import sys, sqlite3, threading
+import sys
 from pathlib import Path
 from datetime import datetime
 
 ROOT = Path(__file__).parent
 sys.path.insert(0, str(ROOT))
 
-from database import initialize_database, get_record_count, get_class_distribution
+from database import (
+    initialize_database, get_record_count, get_class_distribution,
+    store_training_rows,
+)
 from core_engine import (
     train_models,
     calculate_domain_score,
@@ -48,10 +51,6 @@ from core_engine import (
     is_gambling_platform,
 )
 
-DB_DIR  = ROOT / "db"
-DB_PATH = DB_DIR / "url_risk.db"
-db_lock = threading.Lock()
-
 initialize_database()
 
 
@@ -78,8 +77,8 @@ def compute_real_features(url: str, domain: str) -> dict:
     }
 
 
-def store_row(url, domain, risk_label, risk_type):
-    """Compute real features then store in SQLite. Skip if URL already exists."""
+def training_row(url, domain, risk_label, risk_type):
+    """Compute real features and build the row store_training_rows() inserts."""
     f = compute_real_features(url, domain)
 
     # Confidence + severity based on risk label
@@ -100,33 +99,19 @@ def store_row(url, domain, risk_label, risk_type):
         if f["url_score"] > 10: parts.append("suspicious URL structure")
         why = ", ".join(parts).capitalize() if parts else "risk indicators present"
 
-    with db_lock:
-        conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-        try:
-            conn.execute("""
-                INSERT OR IGNORE INTO url_analysis (
-                    url, domain, domain_score, url_score, keyword_score,
-                    security_score, redirect_score, total_score,
-                    predicted_risk_level, predicted_risk_type,
-                    confidence_percent, anomaly_detected,
-                    risk_severity_index, why_risk
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """, (
-                url, domain,
-                f["domain_score"], f["url_score"], f["keyword_score"],
-                f["security_score"], f["redirect_score"], f["total_score"],
-                risk_label, risk_type,
-                confidence, 0, severity, why,
-            ))
-            conn.commit()
-            return conn.total_changes > 0
-        finally:
-            conn.close()
+    return (
+        url, domain,
+        f["domain_score"], f["url_score"], f["keyword_score"],
+        f["security_score"], f["redirect_score"], f["total_score"],
+        risk_label, risk_type,
+        confidence, 0, severity, why,
+    )
 
 
 def inject(url_list, risk_label, risk_type, label):
-    ok = sum(1 for url, domain in url_list
-             if store_row(url, domain, risk_label, risk_type))
+    # One transaction per category; URLs already stored are skipped
+    ok = store_training_rows([training_row(url, domain, risk_label, risk_type)
+                              for url, domain in url_list])
     print(f"  ✓ {label}: {ok}/{len(url_list)} URLs loaded")
     return ok
 